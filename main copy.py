@@ -1,230 +0,0 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import ast
-
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-class CodeRequest(BaseModel):
-    code: str
-
-@app.post("/parse")
-def parse_code(request: CodeRequest):
-    try:
-        tree = ast.parse(request.code)
-        instructions = convert_ast_to_instructions(tree)
-        result = {"valid": True, "error": None, "instructions": instructions}
-        print("Sending response:", result)
-        return result
-    except SyntaxError as e:
-        result = {"valid": False, "error": f"Line {e.lineno}: {e.msg}", "instructions": None}
-        print("Sending error:", result)
-        return result
-
-def convert_ast_to_instructions(tree):
-    """Convert Python AST to simple instruction objects"""
-    instructions = []
-    
-    for node in tree.body:
-        instr = parse_stmt(node)
-        if instr:
-            instructions.append(instr)
-    
-    return instructions
-
-def parse_stmt(stmt):
-    """Parse individual statements"""
-    if isinstance(stmt, ast.Expr):
-        if isinstance(stmt.value, ast.Call):
-            return parse_call(stmt.value)
-        elif isinstance(stmt.value, ast.Await):
-            # Handle await expressions
-            if isinstance(stmt.value.value, ast.Call):
-                instr = parse_call(stmt.value.value)
-                if instr:
-                    instr["await"] = True
-                return instr
-    elif isinstance(stmt, ast.Assign):
-        # Handle variable assignments: x = value
-        if len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
-            var_name = stmt.targets[0].id
-            # Store the expression as a string to be evaluated later
-            value_expr = ast.unparse(stmt.value)
-            return {
-                "type": "assign",
-                "variable": var_name,
-                "expression": value_expr
-            }
-    elif isinstance(stmt, ast.For):
-        return parse_for(stmt)
-    elif isinstance(stmt, ast.While):
-        return parse_while(stmt)
-    elif isinstance(stmt, ast.If):
-        return parse_if(stmt)
-    elif isinstance(stmt, ast.Break):
-        return {"type": "break"}
-    elif isinstance(stmt, ast.FunctionDef):
-        return parse_function(stmt)
-    elif isinstance(stmt, ast.Return):
-        return parse_return(stmt)
-    
-    return None
-
-def parse_call(call_node):
-    """Parse function calls like motor_a.start(50)"""
-    if isinstance(call_node.func, ast.Attribute):
-        obj = call_node.func.value.id if isinstance(call_node.func.value, ast.Name) else None
-        method = call_node.func.attr
-        
-        if obj in ["motor_a", "motor_b"]:
-            if method == "start" and call_node.args:
-                # Handle negative numbers (UnaryOp) and positive (Constant)
-                arg = call_node.args[0]
-                if isinstance(arg, ast.Constant):
-                    speed = arg.value
-                elif isinstance(arg, ast.UnaryOp) and isinstance(arg.op, ast.USub):
-                    speed = -arg.operand.value
-                else:
-                    speed = 0
-                
-                return {"type": "motor_start", "motor": obj[-1].lower(), "speed": speed}
-            elif method == "stop":
-                return {"type": "motor_stop", "motor": obj[-1].lower()}
-        
-        elif obj == "ir_sensor":
-            if method == "get_direction":
-                return {"type": "ir_direction"}
-            elif method == "get_strength":
-                return {"type": "ir_strength"}
-    
-    elif isinstance(call_node.func, ast.Name):
-        func_name = call_node.func.id
-        
-        if func_name == "wait" and call_node.args:
-            seconds = call_node.args[0].value if isinstance(call_node.args[0], ast.Constant) else 0
-            return {"type": "wait", "seconds": seconds}
-        
-        elif func_name == "print":
-            # Handle print statements with multiple arguments
-            if len(call_node.args) == 0:
-                return {"type": "print", "message": ""}
-            elif len(call_node.args) == 1:
-                arg = call_node.args[0]
-                if isinstance(arg, ast.Constant):
-                    return {"type": "print", "message": arg.value}
-                else:
-                    # For expressions, store the unparsed expression
-                    return {"type": "print", "expression": ast.unparse(arg)}
-            else:
-                # Multiple arguments - concatenate them as an expression
-                parts = [ast.unparse(arg) for arg in call_node.args]
-                combined = " + ' ' + ".join(parts)
-                return {"type": "print", "expression": combined}
-        
-        else:
-            # User-defined function call
-            args = []
-            for arg in call_node.args:
-                if isinstance(arg, ast.Constant):
-                    args.append({"type": "constant", "value": arg.value})
-                else:
-                    args.append({"type": "expression", "value": ast.unparse(arg)})
-            
-            return {
-                "type": "function_call",
-                "name": func_name,
-                "args": args
-            }
-    
-    return None
-
-def parse_for(for_node):
-    """Parse for loops"""
-    body_instructions = []
-    for stmt in for_node.body:
-        instr = parse_stmt(stmt)
-        if instr:
-            body_instructions.append(instr)
-    
-    return {
-        "type": "for",
-        "target": ast.unparse(for_node.target),   # e.g. "i"
-        "iter": ast.unparse(for_node.iter),       # e.g. "range(5)"
-        "body": body_instructions
-    }
-
-
-def parse_while(while_node):
-    """Parse while loops"""
-    body_instructions = []
-    for stmt in while_node.body:
-        instr = parse_stmt(stmt)
-        if instr:
-            body_instructions.append(instr)
-    
-    return {
-        "type": "while",
-        "condition": ast.unparse(while_node.test),
-        "body": body_instructions
-    }
-
-def parse_if(if_node):
-    """Parse if/elif/else statements"""
-    body_instructions = []
-    for stmt in if_node.body:
-        instr = parse_stmt(stmt)
-        if instr:
-            body_instructions.append(instr)
-    
-    orelse_instructions = []
-    if if_node.orelse:
-        for stmt in if_node.orelse:
-            instr = parse_stmt(stmt)
-            if instr:
-                orelse_instructions.append(instr)
-    
-    result = {
-        "type": "if",
-        "condition": ast.unparse(if_node.test),
-        "body": body_instructions
-    }
-    
-    # Only add orelse if it exists and has content
-    if orelse_instructions:
-        result["orelse"] = orelse_instructions
-    
-    return result
-
-def parse_function(func_node):
-    """Parse function definitions"""
-    params = [arg.arg for arg in func_node.args.args]
-    
-    body_instructions = []
-    for stmt in func_node.body:
-        instr = parse_stmt(stmt)
-        if instr:
-            body_instructions.append(instr)
-    
-    return {
-        "type": "function_def",
-        "name": func_node.name,
-        "params": params,
-        "body": body_instructions
-    }
-
-def parse_return(return_node):
-    """Parse return statements"""
-    if return_node.value is None:
-        return {"type": "return", "value": None}
-    
-    if isinstance(return_node.value, ast.Constant):
-        return {"type": "return", "value": return_node.value.value}
-    else:
-        return {"type": "return", "expression": ast.unparse(return_node.value)}
\ No newline at end of file
